@@ -1,12 +1,32 @@
+# Streams public market data from Kraken's WebSocket API.
+#
+# Requires Python >= 3.9 and:
+#   websockets >= 14   (recv(decode=False) on the asyncio client)
+#   orjson >= 3.0
+#   msgspec >= 0.16    (msgspec.convert with strict=False)
+#   numpy >= 1.20
+#   uvloop >= 0.18     (optional; uvloop.run)
+
 # Import WebSocket client library (and others)
-import websocket
-import _thread
-import time
+import asyncio
+import websockets
 import json
-import pandas as pd
+import msgspec
+import numpy as np
+import orjson
 
+from collections import namedtuple
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Union, Any
+from functools import cached_property, lru_cache
+from typing import Any, Callable, Optional, Union
+
+try:
+    import uvloop
+except ImportError:
+    # uvloop is optional (and unavailable on Windows); fall back to the
+    # default asyncio event loop.
+    uvloop = None
 
 
 class EventType(str, Enum):
@@ -36,16 +56,31 @@ class EventType(str, Enum):
     ERROR = "error"
     default = ERROR
 
-class AssetPair:
-    def __init__(self, pair: str):
+# Value -> member tables, so dispatch is a dict lookup rather than a call
+# through EnumMeta.__call__.
+_EVENT_BY_STR = {e.value: e for e in EventType}
+
+class AssetPair(namedtuple('AssetPair', ['base', 'quote'])):
+    # Immutable, since interned instances are shared by every message.
+    __slots__ = ()
+
+    @classmethod
+    def from_str(cls, pair: str) -> 'AssetPair':
         """Currency pair A/B with base currency A and quote currency B.
 
         Args:
             pair (str): currency pair string
         """
-        pieces = pair.split("/")
-        self.base = pieces[0]
-        self.quote = pieces[1]
+        # Kraken echoes unparseable pairs (e.g. "XBTUSD") in error replies,
+        # so a missing '/' leaves quote as None instead of raising.
+        base, sep, quote = pair.partition("/")
+        return cls(base, quote if sep else None)
+
+# Interned instances. A session only sees a few dozen distinct pairs and
+# channel names, so every frame for one of them shares a single object.
+@lru_cache(maxsize=256)
+def _pair(pair: str) -> AssetPair:
+    return AssetPair.from_str(pair)
 
 class SystemStatus(str, Enum):
     """Status of connection.
@@ -79,6 +114,8 @@ class SubscriptionInterval(int, Enum):
     X_15DAY = 21600
     default = X_1MIN
 
+_INTERVAL_BY_VALUE = SubscriptionInterval._value2member_map_
+
 class SubscriptionDepth(int, Enum):
     """Depth associated with book subscription in numbers of levels for each side.
 
@@ -92,6 +129,8 @@ class SubscriptionDepth(int, Enum):
     DEPTH_1000 = 1000
     default = DEPTH_10
 
+_DEPTH_BY_VALUE = SubscriptionDepth._value2member_map_
+
 class SubscriptionName(str, Enum):
     """Name of subscription.
 
@@ -119,24 +158,39 @@ class SubscriptionStatus(str, Enum):
     ERROR        = "error"
     default = ERROR
 
-class ChannelName:
-    def __init__(self, channel_name: str):
+_SUBSCRIPTION_STATUS_BY_STR = {s.value: s for s in SubscriptionStatus}
+
+class ChannelName(namedtuple('ChannelName', ['event', 'interval', 'depth'])):
+    # Immutable, since interned instances are shared by every message.
+    __slots__ = ()
+
+    @classmethod
+    def from_str(cls, channel_name: str) -> 'ChannelName':
         """Parses channel name string.
 
         Args:
             channel_name (str): channel name
         """
         pieces = channel_name.split('-')
-        self.event = EventType(pieces[0])
-        self.depth = None
-        self.interval = None
-        if self.event == 'ohlc':
-            self.interval = SubscriptionInterval(int(pieces[1]))
-        elif self.event == 'book':
-            self.depth = SubscriptionDepth(int(pieces[1]))
+        event = _EVENT_BY_STR.get(pieces[0], EventType.ERROR)
+        interval = None
+        depth = None
+        # A missing or non-numeric suffix leaves interval/depth as None.
+        if len(pieces) < 2 or not pieces[1].isdecimal():
+            pass
+        elif event == 'ohlc':
+            interval = _INTERVAL_BY_VALUE.get(int(pieces[1]), SubscriptionInterval.default)
+        elif event == 'book':
+            depth = _DEPTH_BY_VALUE.get(int(pieces[1]), SubscriptionDepth.default)
+        return cls(event, interval, depth)
 
     def __repr__(self) -> dict:
-        return json.dumps(self.__dict__)
+        return json.dumps(self._asdict())
+
+@lru_cache(maxsize=256)
+def _channel(channel_name: str) -> ChannelName:
+    return ChannelName.from_str(channel_name)
+
 class OrderSide(Enum):
     """Order side.
 
@@ -159,6 +213,10 @@ class OrderType(Enum):
     ERROR = "error"
     default = ERROR
 
+# Single-character side/type codes used in trade messages.
+_SIDE_BY_CODE = {'b': OrderSide.BUY, 's': OrderSide.SELL}
+_ORDER_TYPE_BY_CODE = {'m': OrderType.MARKET, 'l': OrderType.LIMIT}
+
 class TimeInForce(Enum):
     GTC = "GCT"
     IOC = "IOC"
@@ -172,49 +230,40 @@ class OrderStatus(Enum):
     EXPIRED = "expired"
 
 class Message:
-    def __init__(self, payload: dict):
-        self._raw = payload
+    """Base for object (dict) shaped messages. Subclasses declare their
+    known fields in ``__slots__`` and fill them once in ``__init__``.
+    """
+    __slots__ = ()
 
-    def __getattr__(self, key) -> Union[Any, None]:
-        return self._raw.get(key, None)
-    
 class SystemStatusMessage(Message):
     """
     https://docs.kraken.com/websockets-beta/#message-systemStatus
     """
+    __slots__ = ('status', 'version')
+
     def __init__(self, payload: dict):
-        super().__init__(payload)
-    
-    @property
-    def status(self) -> Union[str, None]:
-        return self._raw.get('status', None)
-    
-    @property
-    def version(self) -> Union[str, None]:
-        return self._raw.get('version', None)
+        self.status: Union[str, None] = payload.get('status', None)
+        self.version: Union[str, None] = payload.get('version', None)
 
 class SubscriptionStatusMessage(Message):
     """
     https://docs.kraken.com/websockets-beta/#message-subscriptionStatus
     """
-    def __init__(self, payload: dict):
-        super().__init__(payload)
-    
-    @property
-    def channel_id(self) -> Union[int, None]:
-        return self._raw.get('channelID', None)
+    __slots__ = ('channel_id', 'channel_name', 'pair', 'status', 'error_message')
 
-    @property
-    def channel_name(self) -> Union[ChannelName, None]:
-        return ChannelName(self._raw['channelName']) if 'channelName' in self._raw else None
-        
-    @property
-    def pair(self) -> Union[AssetPair, None]:
-        return AssetPair(self._raw['pair']) if 'pair' in self._raw else None
-    
-    @property
-    def status(self) -> Union[SubscriptionStatus, None]:
-        return SubscriptionStatus(self._raw['status']) if 'status' in self._raw else None
+    def __init__(self, payload: dict):
+        self.channel_id: Union[int, None] = payload.get('channelID', None)
+        channel_name = payload.get('channelName', None)
+        pair = payload.get('pair', None)
+        status = payload.get('status', None)
+        self.channel_name: Union[ChannelName, None] = \
+            _channel(channel_name) if type(channel_name) is str else None
+        self.pair: Union[AssetPair, None] = \
+            _pair(pair) if type(pair) is str else None
+        self.status: Union[SubscriptionStatus, None] = \
+            _SUBSCRIPTION_STATUS_BY_STR.get(status, SubscriptionStatus.ERROR) \
+            if type(status) is str else None
+        self.error_message: Union[str, None] = payload.get('errorMessage', None)
 
 class SubscribeMessage:
     """
@@ -224,163 +273,305 @@ class SubscribeMessage:
         pass
 
 
+# Payload schemas. msgspec.convert validates a decoded payload and builds
+# these in a single C pass; strict=False lets it accept Kraken's numeric
+# strings for float/int fields.
+class Quote(msgspec.Struct, array_like=True):
+    price: float
+    wholeLotVolume: int
+    lotVolume: float
+
+class LastTrade(msgspec.Struct, array_like=True):
+    price: float
+    lotVolume: float
+
+class Window(msgspec.Struct, array_like=True):
+    today: float
+    last24Hours: float
+
+class OHLCBar(msgspec.Struct, array_like=True):
+    start: float
+    end: float
+    open: float
+    high: float
+    low: float
+    close: float
+    vwap: float
+    volume: float
+    count: int
+
+class Trade(msgspec.Struct, array_like=True):
+    price: float
+    volume: float
+    timestamp: float
+    side_code: str
+    type_code: str
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp, tz=timezone.utc)
+
+    @property
+    def side(self) -> OrderSide:
+        return _SIDE_BY_CODE.get(self.side_code[:1], OrderSide.ERROR)
+
+    @property
+    def order_type(self) -> OrderType:
+        return _ORDER_TYPE_BY_CODE.get(self.type_code[:1], OrderType.ERROR)
+
 class ArrayMessage:
     def __init__(self, payload: list):
-        self.pair = AssetPair(payload[-1])
-        self.channel = ChannelName(payload[-2])
+        self.pair = _pair(payload[-1])
+        self.channel = _channel(payload[-2])
         self._raw = payload[1]
 
 class TickerMessage(ArrayMessage):
+    """Each field is converted by msgspec on first access and cached, so
+    fields that are never read cost nothing.
+    """
     def __init__(self, payload: list):
         super().__init__(payload)
 
-        self.ask = {
-            "price": float(self._raw['a'][0]),
-            "wholeLotVolume": int(self._raw['a'][1]),
-            "lotVolume": float(self._raw['a'][2])
-        }
-
-        self.bid = {
-            "price": float(self._raw['b'][0]),
-            "wholeLotVolume": int(self._raw['b'][1]),
-            "lotVolume": float(self._raw['b'][2])
-        }
-
-        self.open = {
-            "today": float(self._raw['o'][0]),
-            "last24Hours": float(self._raw['o'][1])
-        }
-
-        self.high = {
-            "today": float(self._raw['h'][0]),
-            "last24Hours": float(self._raw['h'][1])
-        }
-
-        self.low = {
-            "today": float(self._raw['l'][0]),
-            "last24Hours": float(self._raw['l'][1])
-        }
-
-        self.close = {
-            "price": float(self._raw['c'][0]),
-            "lotVolume": float(self._raw['c'][1])
-        }
-
-        self.volume = {
-            "today": float(self._raw['v'][0]),
-            "last24Hours": float(self._raw['v'][1])
-        }
-
-        # Number of trades
-        self.trades = {
-            "today": float(self._raw['t'][0]),
-            "last24Hours": float(self._raw['t'][1])
-        }
-
-        # Volume weighted average price
-        self.vwap = {
-            "today": float(self._raw['p'][0]),
-            "last24Hours": float(self._raw['p'][1])
-        }
+    @cached_property
+    def ask(self) -> Quote:
+        return msgspec.convert(self._raw['a'], Quote, strict=False)
+
+    @cached_property
+    def bid(self) -> Quote:
+        return msgspec.convert(self._raw['b'], Quote, strict=False)
+
+    @cached_property
+    def open(self) -> Window:
+        return msgspec.convert(self._raw['o'], Window, strict=False)
+
+    @cached_property
+    def high(self) -> Window:
+        return msgspec.convert(self._raw['h'], Window, strict=False)
+
+    @cached_property
+    def low(self) -> Window:
+        return msgspec.convert(self._raw['l'], Window, strict=False)
+
+    @cached_property
+    def close(self) -> LastTrade:
+        return msgspec.convert(self._raw['c'], LastTrade, strict=False)
+
+    @cached_property
+    def volume(self) -> Window:
+        return msgspec.convert(self._raw['v'], Window, strict=False)
+
+    # Number of trades
+    @cached_property
+    def trades(self) -> Window:
+        return msgspec.convert(self._raw['t'], Window, strict=False)
+
+    # Volume weighted average price
+    @cached_property
+    def vwap(self) -> Window:
+        return msgspec.convert(self._raw['p'], Window, strict=False)
 
 class OHLCMessage(ArrayMessage):
     def __init__(self, payload: list):
         super().__init__(payload)
-        self.start_time = pd.to_datetime(float(self._raw[0]), unit='s')
-        self.end_time = pd.to_datetime(float(self._raw[1]), unit='s')
-        self.open = float(self._raw[2])
-        self.high = float(self._raw[3])
-        self.low = float(self._raw[4])
-        self.close = float(self._raw[5])
-        self.vwap = float(self._raw[6])
-        self.volume = float(self._raw[7])
-        self.count = int(self._raw[8])
+        self._raw = msgspec.convert(self._raw, OHLCBar, strict=False)
+
+    @cached_property
+    def start_time(self) -> datetime:
+        return datetime.fromtimestamp(self._raw.start, tz=timezone.utc)
+
+    @cached_property
+    def end_time(self) -> datetime:
+        return datetime.fromtimestamp(self._raw.end, tz=timezone.utc)
+
+    @property
+    def open(self) -> float:
+        return self._raw.open
+
+    @property
+    def high(self) -> float:
+        return self._raw.high
+
+    @property
+    def low(self) -> float:
+        return self._raw.low
+
+    @property
+    def close(self) -> float:
+        return self._raw.close
+
+    @property
+    def vwap(self) -> float:
+        return self._raw.vwap
+
+    @property
+    def volume(self) -> float:
+        return self._raw.volume
+
+    @property
+    def count(self) -> int:
+        return self._raw.count
 
 class TradeMessage(ArrayMessage):
+    """A trade frame carries every trade executed since the previous one."""
     def __init__(self, payload: list):
         super().__init__(payload)
-        self.price = float(self._raw[0])
-        self.price = float(self._raw[1])
-        self.time = pd.to_datetime(float(self._raw[2]), unit='s')
-        self.side = OrderSide.BUY if self._raw[3].startswith('b') else OrderSide.SELL
-        order_type = self._raw[4]
-        if order_type.startswith('m'):
-            self.order_type = OrderType.MARKET
-        elif order_type.startswith('l'):
-            self.order_type = OrderType.LIMIT
-        else:
-            self.order_type = OrderType.ERROR
-        print()
+        self.trades = msgspec.convert(self._raw, list[Trade], strict=False)
+
+def _print_trade(d: list):
+    message = TradeMessage(d)
+    for trade in message.trades:
+        print(d[-1], trade.time, trade.side.value, trade.order_type.value,
+              trade.price, trade.volume)
+
+def _ignore(d: Union[dict, list]):
+    pass
+
+# Handlers for object frames ({"event": ...}), keyed by event type. They
+# only ever receive dicts; nothing uses these events yet.
+_EVENT_HANDLERS = {
+    EventType.PONG: _ignore,
+    EventType.HEARTBEAT: _ignore,
+    EventType.SYSTEM_STATUS: _ignore,
+    EventType.SUBSCRIPTION_STATUS: _ignore
+}
+
+# Handlers for array frames, keyed by the event of their channel name.
+# They only ever receive lists that passed _is_array_message. Spread,
+# book and unknown channels fall through to _ignore.
+_CHANNEL_HANDLERS = {
+    EventType.TICKER: TickerMessage,
+    EventType.OHLC: OHLCMessage,
+    EventType.TRADE: _print_trade
+}
+
+# Array message handler per channel name, resolved once on first sight so
+# later frames skip channel parsing and event comparison entirely. Only
+# names of a known event are kept, and at most MAX_CACHED_CHANNELS of them.
+MAX_CACHED_CHANNELS = 256
+_DISPATCH = {}
+
+def _handler_for(channel_name: str) -> Callable[[list], Any]:
+    handler = _DISPATCH.get(channel_name)
+    if handler is None:
+        event = _channel(channel_name).event
+        handler = _CHANNEL_HANDLERS.get(event, _ignore)
+        if event is not EventType.ERROR and len(_DISPATCH) < MAX_CACHED_CHANNELS:
+            _DISPATCH[channel_name] = handler
+    return handler
+
+def _is_array_message(d: Any) -> bool:
+    # [channelID, payload..., channelName, pair]; book frames may carry two
+    # payloads, so only the minimum length is fixed.
+    return type(d) is list and len(d) >= 4 \
+        and type(d[-2]) is str and type(d[-1]) is str
+
+def dispatch_message(d: Any):
+    # Frames of the wrong shape are dropped by these checks rather than
+    # by raising and catching an exception.
+    if type(d) is dict:
+        event = d.get('event')
+        if type(event) is str:
+            _EVENT_HANDLERS.get(_EVENT_BY_STR.get(event), _ignore)(d)
+    elif _is_array_message(d):
+        _handler_for(d[-2])(d)
+    else:
+        pass
 
-def parse_message2(msg: str):
+def parse_message2(msg: bytes):
     try:
-        d = json.loads(msg)
-        if isinstance(d, dict):
-            event = EventType(d['event'])
-            if event == EventType.PONG:
-                pass
-            elif event == EventType.HEARTBEAT:
-                pass
-            elif event == EventType.SYSTEM_STATUS:
-                pass
-            elif event == EventType.SUBSCRIPTION_STATUS:
-                pass
-            else:
-                pass
-        elif isinstance(d, list):
-            channel = ChannelName(d[-2])
-            event = channel.event
-            if event == EventType.TICKER:
-                TickerMessage(d)
-            elif event == EventType.OHLC:
-                ohlc = OHLCMessage(d)
-            elif event == EventType.TRADE:
-                trade = TradeMessage(d)
-                print(trade.__dict__)
-            elif event == EventType.SPREAD:
-                pass
-            elif event == EventType.BOOK:
-                pass
-        else:
-            pass
-    except Exception as e:
+        d = orjson.loads(msg)
+    except orjson.JSONDecodeError as e:
+        print(e)
+        return
+    try:
+        dispatch_message(d)
+    except msgspec.ValidationError as e:
+        # Right shape, but a payload that does not match its schema.
         print(e)
 
+def parse_batch(batch: list):
+    """Decodes and dispatches a batch of frames in order.
 
-def parse_message(msg: str) -> dict:
-    try:
-        d = json.loads(msg)
-        if isinstance(d, dict):
-            if d.get('event', '') == 'subscriptionStatus':
-                sm = SubscriptionStatus(d)
-                sub_status = sm.status
-                print()
-        else:
+    Each WebSocket frame carries exactly one message, so every frame is
+    decoded on its own; batching only amortises the trip through the
+    dispatch loop.
 
-            payload = d[1]
-            out = {'channel': d[-2],
-                   'pair': d[-1]}
-            if 'ohlc' in out['channel']:
-                out['data'] = parse_ohlc(payload)
-            elif out['channel'] == 'trade':
-                out['data'] = parse_trade(payload)
-            elif out['channel'] == 'spread':
-                pass
-    except Exception as e:
+    Args:
+        batch (list): raw JSON frames (bytes) as received
+    """
+    for msg in batch:
+        parse_message2(msg)
+
+
+def parse_message(msg: bytes) -> Optional[dict]:
+    """Parses an OHLC or trade frame into plain data.
+
+    Args:
+        msg (bytes): raw JSON frame
+
+    Returns:
+        dict: 'channel', 'pair' and 'data' keys, where 'data' is None for
+        other channels or a payload of the wrong shape. None for anything
+        that is not an array frame. A payload of the right shape holding
+        values float() cannot convert raises ValueError or TypeError.
+    """
+    try:
+        d = orjson.loads(msg)
+    except orjson.JSONDecodeError as e:
         print(str(e))
-    return out
+        return None
+    if not _is_array_message(d):
+        return None
+    channel = d[-2]
+    payload = d[1]
+    if type(payload) is not list:
+        data = None
+    elif 'ohlc' in channel:
+        data = parse_ohlc(payload) if len(payload) >= 9 else None
+    elif channel == 'trade':
+        ok = all(type(t) is list and len(t) >= 5 for t in payload)
+        data = parse_trade(payload) if ok else None
+    else:
+        data = None
+    # Built in one go with every key present, so the dict is never
+    # resized after creation.
+    return {'channel': channel,
+            'pair': d[-1],
+            'data': data}
+
+def _flag_byte(flag: str) -> int:
+    # ASCII code of a one-letter flag; 0 for an empty or non-ASCII flag, so
+    # every trade yields exactly one byte and the columns stay aligned.
+    c = flag[:1]
+    return ord(c) if c and c.isascii() else 0
 
 def parse_trade(payload: list) -> dict:
-    out = []
-    for t in payload:
-        out.append({
-            'price': float(t[0]),
-            'volume': float(t[1]),
-            'timestamp': float(t[2]),
-            'side': 'buy' if t[3] == 'b' else 'sell',
-            'type': 'market' if t[4] == 'm' else 'limit'
-        })
-    return out
+    """Converts a batch of trades into one contiguous array per field.
+
+    Args:
+        payload (list): trades as sent by Kraken
+
+    Returns:
+        dict: float64 'price', 'volume' and 'timestamp' columns, plus uint8
+        'side' and 'type' columns holding the ASCII code of the one-letter
+        flags (b/s and m/l), or 0 for an empty or non-ASCII flag
+    """
+    # Kraken sends numbers as strings, so each value still needs a float()
+    # call; one pass fills preallocated columns with them. This is not a
+    # faster parse than a list of dicts (numpy adds a few microseconds per
+    # frame); the gain is the dense layout for vectorised use downstream.
+    price, volume, timestamp = np.empty((3, len(payload)))
+    for i, t in enumerate(payload):
+        price[i] = float(t[0])
+        volume[i] = float(t[1])
+        timestamp[i] = float(t[2])
+    return {
+        'price': price,
+        'volume': volume,
+        'timestamp': timestamp,
+        'side': np.fromiter((_flag_byte(t[3]) for t in payload), np.uint8, len(payload)),
+        'type': np.fromiter((_flag_byte(t[4]) for t in payload), np.uint8, len(payload))
+    }
 
 def parse_ohlc(payload: list) -> dict:
     return {
@@ -398,42 +589,75 @@ def parse_ohlc(payload: list) -> dict:
 def parse_spread(payload: list) -> dict:
     return {
         'bid': float(payload[0]),
-        'ask': float(payload[0]),
-        'timestamp': float(payload[0]),
-        'bidVolume': float(payload[0]),
-        'askVolume': float(payload[0])
+        'ask': float(payload[1]),
+        'timestamp': float(payload[2]),
+        'bidVolume': float(payload[3]),
+        'askVolume': float(payload[4])
     }
 
-# Define WebSocket callback functions
-def ws_message(ws, message):
-    msg = parse_message2(message)
-    if 'event' not in msg.keys():
-        print("WebSocket thread: %s" % msg)
-
-def ws_open(ws):
-    ws.send('{"event":"subscribe", "subscription":{"name":"ohlc", "interval": 5}, "pair":["BTC/USD","DOGE/USD"]}')
-    ws.send('{"event":"subscribe", "subscription":{"name":"book"}, "pair":["BTC/USD","DOGE/USD"]}')
-    ws.send('{"event":"subscribe", "subscription":{"name":"trade"}, "pair":["BTC/USD","DOGE/USD"]}')
-
-def ws_thread(ws):
-    ws.run_forever()
-
-# Start a new thread for the WebSocket interface
-ws = websocket.WebSocketApp("wss://ws.kraken.com/", on_open=ws_open, on_message=ws_message)
-_thread.start_new_thread(ws_thread, (ws,))
-
-# Continue other (non WebSocket) tasks in the main thread
-subscribe = False
-while True:
-    time.sleep(10)
-    if subscribe == False:
-        print("Unsubscribing")
-        ws.send('{"event":"unsubscribe", "subscription":{"name":"trade"}, "pair":["DOGE/USD"]}')
-        subscribe = True
-    else:
-        print("Subscribing")
-        ws.send('{"event":"subscribe", "subscription":{"name":"trade"}, "pair":["DOGE/USD"]}')
-        subscribe = False
+# Frames are queued by the receive loop and parsed in batches of up to
+# BATCH_SIZE by the dispatcher. Once MAX_PENDING_FRAMES are waiting, the
+# receive loop stops reading until the dispatcher catches up.
+BATCH_SIZE = 64
+MAX_PENDING_FRAMES = 10000
+
+SUBSCRIPTIONS = [
+    '{"event":"subscribe", "subscription":{"name":"ohlc", "interval": 5}, "pair":["BTC/USD","DOGE/USD"]}',
+    '{"event":"subscribe", "subscription":{"name":"book"}, "pair":["BTC/USD","DOGE/USD"]}',
+    '{"event":"subscribe", "subscription":{"name":"trade"}, "pair":["BTC/USD","DOGE/USD"]}'
+]
+
+async def receive(ws, frames: asyncio.Queue):
+    try:
+        # decode=False hands over text frames as the raw UTF-8 bytes;
+        # orjson parses those directly, so no str is ever built.
+        while True:
+            await frames.put(await ws.recv(decode=False))
+    except websockets.ConnectionClosedOK:
+        pass
+
+async def dispatch(frames: asyncio.Queue):
+    while True:
+        batch = [await frames.get()]
+        while len(batch) < BATCH_SIZE and not frames.empty():
+            batch.append(frames.get_nowait())
+        parse_batch(batch)
+
+async def periodic_resubscribe(ws):
+    # Continue other (non WebSocket) tasks alongside the stream
+    subscribe = False
+    while True:
+        await asyncio.sleep(10)
+        if subscribe == False:
+            print("Unsubscribing")
+            await ws.send('{"event":"unsubscribe", "subscription":{"name":"trade"}, "pair":["DOGE/USD"]}')
+            subscribe = True
+        else:
+            print("Subscribing")
+            await ws.send('{"event":"subscribe", "subscription":{"name":"trade"}, "pair":["DOGE/USD"]}')
+            subscribe = False
+
+async def run():
+    frames = asyncio.Queue(maxsize=MAX_PENDING_FRAMES)
+    async with websockets.connect("wss://ws.kraken.com/") as ws:
+        for subscription in SUBSCRIPTIONS:
+            await ws.send(subscription)
+        tasks = [asyncio.create_task(receive(ws, frames)),
+                 asyncio.create_task(dispatch(frames)),
+                 asyncio.create_task(periodic_resubscribe(ws))]
+        # Stop as soon as any task ends: the connection closing, or an
+        # error escaping one of them. result() re-raises that error instead
+        # of leaving the receiver blocked on a full queue.
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()
+
+if uvloop is not None:
+    uvloop.run(run())
+else:
+    asyncio.run(run())
 
 class KrakenWebsocketClient:
     def __init__(self):